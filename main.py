@@ -1,33 +1,119 @@
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
+import asyncio
+from bs4 import BeautifulSoup, SoupStrainer
 import time
 import sqlite3
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse, parse_qs
 from datetime import datetime
 import os
 import re
 import argparse
+import atexit
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Cap in-flight requests so we stay polite to the server
+sem = asyncio.Semaphore(10)
+
+# Transient statuses worth retrying with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+FETCH_RETRIES = 3
+
+# Only build Tag objects for the subtrees we actually read, skipping
+# navbars, ads, scripts etc.
+LIST_STRAINER = SoupStrainer('ul', class_='prd-details')
+META_STRAINER = SoupStrainer(class_='prd-meta')
+
+# Filename sanitization, compiled once
+_SANITIZE_RE = re.compile(r'[^\w\s-]')
+_WS_RE = re.compile(r'\s+')
+
+class TokenBucket:
+    """Token-bucket rate limiter for polite concurrent fetching"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate          # tokens refilled per second
+        self.capacity = capacity  # max burst size
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    async def acquire(self):
+        """Wait until a token is available, then consume it"""
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
 
 class PhonekyGamesScraper:
     def __init__(self, download=False):
         self.base_url = 'https://phoneky.com/games/'
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            # HTML compresses ~5-10x; aiohttp decompresses transparently
+            # (brotli via the Brotli package)
+            'Accept-Encoding': 'gzip, deflate, br'
         }
         self.db_name = 'phoneky_games.db'
         self.should_download = download
+        self._seen = set()
+        self._details_cache = {}
+
+        # ~3 req/s sustained with bursts of 5; replaces fixed sleeps so
+        # concurrent fetches stay polite without idling
+        self.bucket = TokenBucket(rate=3, capacity=5)
         
         if self.should_download:
             self.download_folder = 'JARs'
             os.makedirs(self.download_folder, exist_ok=True)
-            
+
+        # One connection for the whole run; opening per page re-parses
+        # the schema and reacquires the file lock every time.
+        # isolation_level=None leaves transaction control to our
+        # explicit BEGIN/COMMIT.
+        self.conn = sqlite3.connect(
+            self.db_name, isolation_level=None, check_same_thread=False
+        )
+        atexit.register(self.conn.close)
+
         self.setup_database()
 
+        # DB writes run on a dedicated thread so the fsync for page N
+        # overlaps the HTTP fetches for page N+1. The bounded queue
+        # back-pressures the fetcher if the disk falls behind.
+        self._write_q = queue.Queue(maxsize=4)
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+
+        # lxml parsing runs here so it overlaps the event loop's
+        # network I/O instead of blocking it
+        self._parse_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+    @staticmethod
+    def _tune_connection(conn):
+        """Apply the per-connection pragmas (WAL itself is persistent,
+        but these reset to defaults on every new connection)"""
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-20000')  # 20MB page cache
+
     def setup_database(self):
         """Create the database and tables if they don't exist"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
+        cursor = self.conn.cursor()
+
+        # WAL avoids the double write + fsync of the rollback journal and
+        # lets a concurrent reader (e.g. a dashboard) not block the scraper
+        cursor.execute('PRAGMA journal_mode=WAL')
+        self._tune_connection(self.conn)
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS games (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,137 +138,227 @@ class PhonekyGamesScraper:
                 scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        
-        conn.commit()
-        conn.close()
 
-    def get_game_details(self, game_url):
+        # Lets get_last_scraped_page resolve MAX(page_number) for
+        # status='success' from the index instead of a full table scan
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_scraping_log_status_page
+            ON scraping_log(status, page_number DESC)
+        ''')
+
+    async def fetch(self, session, url):
+        """Fetch a URL and return the response body as bytes,
+        retrying transient server errors with backoff"""
+        for attempt in range(FETCH_RETRIES):
+            async with sem:
+                await self.bucket.acquire()
+                async with session.get(url) as response:
+                    if (response.status not in RETRY_STATUSES
+                            or attempt == FETCH_RETRIES - 1):
+                        # Raise on errors so pages aren't logged as
+                        # 'success' with an empty game list
+                        response.raise_for_status()
+                        return await response.read()
+
+            # Back off outside the semaphore so retries don't hold a slot
+            await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def get_game_details(self, session, game_url):
         """Get additional details from game's page"""
+        # URLs are already canonical via urljoin, so a plain dict keyed
+        # on them makes within-run repeats (page retries, duplicate
+        # listings) free
+        cached = self._details_cache.get(game_url)
+        if cached is not None:
+            return cached
+
         try:
-            # Extract game ID from URL
-            game_id = game_url.split('id=')[1]  # Gets j4j42203 from the URL
-            
+            # Extract game ID from URL, e.g. j4j42203
+            query = parse_qs(urlparse(game_url).query)
+            game_id = query.get('id', [None])[0]
+            if not game_id:
+                print(f"No game id in URL: {game_url}")
+                return "unknown", None
+
             # Construct download URL
             game_file_url = f"https://phoneky.com/games/?p=download-item&id={game_id}&tt=181"
-            
+
             # Get screen size from game page
-            response = requests.get(game_url, headers=self.headers)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            html = await self.fetch(session, game_url)
+            soup = await asyncio.get_running_loop().run_in_executor(
+                self._parse_pool,
+                lambda: BeautifulSoup(html, 'lxml', parse_only=META_STRAINER)
+            )
             
-            # Get screen size
+            # Get screen size - match the dd adjacent to the Screen: dt
+            # in one selector instead of scanning every dt in Python
             screen_size = None
-            meta_div = soup.select_one('.prd-meta')
-            if meta_div:
-                dt_elements = meta_div.find_all('dt')
-                for dt in dt_elements:
-                    if 'Screen:' in dt.text:
-                        screen_dd = dt.find_next('dd')
-                        if screen_dd:
-                            screen_size = screen_dd.text.strip()
-                        break
+            screen_dd = soup.select_one('.prd-meta dt:-soup-contains("Screen:") + dd')
+            if screen_dd:
+                screen_size = screen_dd.text.strip()
             
             # If we couldn't find the screen size, use a default value
             if not screen_size:
                 screen_size = "unknown"
                 
             print(f"Found details for {game_url}: Screen={screen_size}, Download URL={game_file_url}")
-            
+
+            # Only cache successes so transient errors stay retryable
+            self._details_cache[game_url] = (screen_size, game_file_url)
+
             return screen_size, game_file_url
-            
+
         except Exception as e:
             print(f"Error getting details for {game_url}: {str(e)}")
             return "unknown", None
 
-    def download_game(self, game_file_url, title, screen_size):
+    async def download_game(self, session, game_file_url, title, screen_size):
         """Download game file and save to JARs folder"""
         try:
-            response = requests.get(game_file_url, headers=self.headers)
-            
             # Clean title for filename
-            clean_title = re.sub(r'[^\w\s-]', '', title)
-            clean_title = re.sub(r'\s+', '-', clean_title)
-            
+            clean_title = _WS_RE.sub('-', _SANITIZE_RE.sub('', title))
+
             # Create filename
             filename = f"{clean_title}-{screen_size}.jar"
             filepath = os.path.join(self.download_folder, filename)
-            
-            # Save file
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            
+
+            # If the JAR is already on disk at the advertised size,
+            # skip the transfer - a HEAD is a few hundred bytes
+            if os.path.exists(filepath):
+                async with sem:
+                    await self.bucket.acquire()
+                    async with session.head(game_file_url, allow_redirects=True) as head:
+                        if head.headers.get('Content-Length') == str(os.path.getsize(filepath)):
+                            print(f"Already downloaded {filename}, skipping")
+                            return filename
+
+            # Stream to a temp file and rename into place so a killed
+            # run never leaves a partial JAR that looks complete
+            tmp_path = filepath + '.part'
+            async with sem:
+                await self.bucket.acquire()
+                async with session.get(game_file_url) as response:
+                    response.raise_for_status()
+                    with open(tmp_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(65536):
+                            f.write(chunk)
+            os.replace(tmp_path, filepath)
+
             return filename
         except Exception as e:
             print(f"Error downloading game {title}: {str(e)}")
             return None
 
-    def parse_games_list(self, soup):
-        """Parse games from a single page"""
-        games = []
+    async def parse_game_item(self, session, item):
+        """Parse one listing item and fetch its details"""
+        try:
+            title = item.select_one('h3.title').text.strip()
+            url = item.select_one('a[title]')['href']
+            image = item.select_one('img.photoThumb')['src']
+            category = item.select_one('.id-num a').text.strip()
+            size = item.select_one('.fsize').text.strip()
+
+            full_url = urljoin(self.base_url, url)
+
+            # Already in the DB from a previous run - skip the detail fetch
+            if full_url in self._seen:
+                return None
+
+            # Get additional details
+            print(f"\nGetting details for: {title}")
+            screen_size, game_file_url = await self.get_game_details(session, full_url)
+
+            # Download game only if should_download is True
+            local_name = None
+            if self.should_download and game_file_url:
+                local_name = await self.download_game(session, game_file_url, title, screen_size)
+
+            return {
+                'title': title,
+                'url': full_url,
+                'image_url': image,
+                'category': category,
+                'size': size,
+                'screen_size': screen_size,
+                'game_file_url': game_file_url,
+                'local_name': local_name
+            }
+
+        except Exception as e:
+            print(f"Error parsing game item: {str(e)}")
+            return None
+
+    async def parse_games_list(self, session, soup):
+        """Parse games from a single page, fetching details concurrently"""
         game_items = soup.select('ul.prd-details li')
-        
-        for item in game_items:
-            try:
-                title = item.select_one('h3.title').text.strip()
-                url = item.select_one('a[title]')['href']
-                image = item.select_one('img.photoThumb')['src']
-                category = item.select_one('.id-num a').text.strip()
-                size = item.select_one('.fsize').text.strip()
-                
-                # Get additional details
-                print(f"\nGetting details for: {title}")
-                screen_size, game_file_url = self.get_game_details(urljoin(self.base_url, url))
-                
-                # Download game only if should_download is True
-                local_name = None
-                if self.should_download and game_file_url:
-                    local_name = self.download_game(game_file_url, title, screen_size)
-                
-                game = {
-                    'title': title,
-                    'url': urljoin(self.base_url, url),
-                    'image_url': image,
-                    'category': category,
-                    'size': size,
-                    'screen_size': screen_size,
-                    'game_file_url': game_file_url,
-                    'local_name': local_name
-                }
-                
-                games.append(game)
-                time.sleep(1)  # Delay between requests
-                
-            except Exception as e:
-                print(f"Error parsing game item: {str(e)}")
-                continue
-        
-        return games
 
-    def save_games_to_db(self, games, page_number):
+        results = await asyncio.gather(
+            *(self.parse_game_item(session, item) for item in game_items)
+        )
+
+        return [game for game in results if game is not None]
+
+    @staticmethod
+    def _game_row(game):
+        """Flatten a game dict into an insert tuple"""
+        return (
+            game['title'], game['url'], game['image_url'],
+            game['category'], game['size'], game['screen_size'],
+            game['game_file_url'], game['local_name']
+        )
+
+    def _writer_loop(self):
+        """Drain queued pages into the database on the writer thread"""
+        # The writer owns its own connection; a single dedicated thread
+        # sidesteps sqlite's cross-thread sharing rules entirely
+        conn = sqlite3.connect(self.db_name, isolation_level=None)
+        self._tune_connection(conn)
+        try:
+            while True:
+                item = self._write_q.get()
+                try:
+                    if item is None:
+                        break
+                    page_number, games = item
+                    self.save_games_to_db(conn, games, page_number)
+                except Exception as e:
+                    print(f"Error saving page {item[0]}: {str(e)}")
+                finally:
+                    self._write_q.task_done()
+        finally:
+            conn.close()
+
+    def save_games_to_db(self, conn, games, page_number):
         """Save games to database"""
-        conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
-        
+
         try:
-            for game in games:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO games 
-                    (title, url, image_url, category, size, screen_size, game_file_url, local_name)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    game['title'], game['url'], game['image_url'], 
-                    game['category'], game['size'], game['screen_size'],
-                    game['game_file_url'], game['local_name']
-                ))
-            
+            cursor.execute('BEGIN')
+            # Refresh rows whose screen size was never resolved, e.g.
+            # when a retry finally returns real details
+            cursor.executemany('''
+                INSERT INTO games
+                (title, url, image_url, category, size, screen_size, game_file_url, local_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    screen_size = excluded.screen_size,
+                    game_file_url = excluded.game_file_url,
+                    local_name = COALESCE(excluded.local_name, games.local_name)
+                WHERE games.screen_size = 'unknown' OR games.screen_size IS NULL
+            ''', (self._game_row(game) for game in games))
+
             cursor.execute('''
                 INSERT INTO scraping_log (page_number, status, message)
                 VALUES (?, ?, ?)
             ''', (
                 page_number, 'success', f'Scraped {len(games)} games'
             ))
-            
+
             conn.commit()
-            
+
+            # Remember the URLs so repeats within this run are skipped too
+            self._seen.update(game['url'] for game in games)
+
         except Exception as e:
             conn.rollback()
             cursor.execute('''
@@ -191,61 +367,120 @@ class PhonekyGamesScraper:
             ''', (
                 page_number, 'error', str(e)
             ))
-            conn.commit()
             raise e
-        
+
+    async def _produce_pages(self, session, start_page, end_page, page_q):
+        """Prefetch listing pages ahead of the consumer"""
+        try:
+            for page in range(start_page, end_page + 1):
+                try:
+                    html = await self.fetch(session, f"{self.base_url}?page={page}")
+                    await page_q.put((page, html))
+                except Exception as e:
+                    print(f"Error fetching page {page}: {str(e)}")
         finally:
-            conn.close()
+            # Always unblock the consumer, even if the loop itself failed
+            await page_q.put(None)
 
-    def scrape(self, start_page=None, end_page=528):
+    async def scrape_page(self, session, html):
+        """Parse a listing page and fetch details for its games"""
+        soup = await asyncio.get_running_loop().run_in_executor(
+            self._parse_pool,
+            lambda: BeautifulSoup(html, 'lxml', parse_only=LIST_STRAINER)
+        )
+        return await self.parse_games_list(session, soup)
+
+    async def scrape(self, start_page=None, end_page=528):
         """Main scraping method"""
         if start_page is None:
             start_page = self.get_last_scraped_page() + 1
-        
+
         print(f"Starting scrape from page {start_page} to {end_page}")
-        
-        for page in range(start_page, end_page + 1):
-            try:
-                print(f"Scraping page {page}...")
-                
-                response = requests.get(
-                    f"{self.base_url}?page={page}",
-                    headers=self.headers
-                )
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                games = self.parse_games_list(soup)
-                self.save_games_to_db(games, page)
-                
-                print(f"Successfully scraped page {page} - Found {len(games)} games")
-                
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f"Error on page {page}: {str(e)}")
-                continue
+
+        # Skip detail fetches for games scraped on previous runs
+        self._seen = self._load_existing_urls()
+
+        # Resolve phoneky.com once an hour instead of per connection,
+        # and keep idle sockets open well past the default 15s so the
+        # between-page pause doesn't cost a new handshake
+        connector = aiohttp.TCPConnector(
+            limit=20,
+            use_dns_cache=True,
+            ttl_dns_cache=3600,
+            keepalive_timeout=60
+        )
+        timeout = aiohttp.ClientTimeout(total=60, connect=5)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=self.headers
+        ) as session:
+            # Producer prefetches listing HTML while the consumer parses
+            # the previous page and fetches its detail pages; the bounded
+            # queue keeps it at most two pages ahead
+            page_q = asyncio.Queue(maxsize=2)
+            producer = asyncio.create_task(
+                self._produce_pages(session, start_page, end_page, page_q)
+            )
+
+            while True:
+                item = await page_q.get()
+                if item is None:
+                    break
+                page, html = item
+
+                try:
+                    print(f"Scraping page {page}...")
+
+                    games = await self.scrape_page(session, html)
+                    self._write_q.put((page, games))
+
+                    print(f"Successfully scraped page {page} - Found {len(games)} games")
+
+                except Exception as e:
+                    print(f"Error on page {page}: {str(e)}")
+                    continue
+
+            # Re-raises anything that killed the producer loop itself
+            # (per-page fetch errors are handled inside it)
+            await producer
+
+        # Wait for queued pages to hit the DB, then stop the writer
+        self._write_q.join()
+        self._write_q.put(None)
+        self._writer.join()
+
+    def _load_existing_urls(self):
+        """Load URLs already in the games table for resume-skip"""
+        try:
+            cursor = self.conn.cursor()
+            # Leave rows without a resolved screen size out of the seen
+            # set so a rerun refetches them and the upsert can fill
+            # in the real details
+            cursor.execute('''
+                SELECT url FROM games
+                WHERE screen_size IS NOT NULL AND screen_size != 'unknown'
+            ''')
+            return {row[0] for row in cursor.fetchall()}
+
+        except Exception as e:
+            print(f"Error loading existing URLs: {str(e)}")
+            return set()
 
     def get_last_scraped_page(self):
         """Get the last successfully scraped page number"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         try:
+            cursor = self.conn.cursor()
             cursor.execute('''
-                SELECT MAX(page_number) 
-                FROM scraping_log 
+                SELECT MAX(page_number)
+                FROM scraping_log
                 WHERE status = 'success'
             ''')
-            
+
             result = cursor.fetchone()[0]
             return result if result is not None else 0
-            
+
         except Exception as e:
             print(f"Error getting last scraped page: {str(e)}")
             return 0
-            
-        finally:
-            conn.close()
 
 
 
@@ -261,10 +496,10 @@ def main():
     scraper = PhonekyGamesScraper(download=args.download)
     
     # Start scraping
-    scraper.scrape(
+    asyncio.run(scraper.scrape(
         start_page=args.start_page,
         end_page=args.end_page
-    )
+    ))
 
 if __name__ == "__main__":
     main()